@@ -8,11 +8,11 @@ from datetime import datetime
 from auth.google_oauth import get_flow
 from googleapiclient.errors import HttpError
 from google.oauth2.credentials import Credentials
-from security.ml_detector import ml_predict, get_explanation_html, ReplyAgent
+from security.ml_detector import ml_predict, ml_predict_batch, get_explanation_html, ReplyAgent
 from security.auto_del import move_to_trash, restore_from_trash, delete_permanently
 from database.db import init_db, reset_scan_data
 from database.logs import log_email
-from utils.database import get_db_connection
+from utils.database import get_db_connection, execute_query, execute_query_template, register_template, warm_pool
 from middleware.auth import require_auth, get_gmail_service, parse_credentials_from_session
 from middleware.errors import register_error_handlers, handle_error
 from config import config
@@ -56,6 +56,14 @@ app.config.update(
 
 register_error_handlers(app)
 init_db()
+warm_pool()
+
+# Scan results for a page of messages; :ids is a JSON array of message IDs
+register_template("email_status_by_ids", """
+    SELECT message_id, phishing, confidence, reason, explanation
+    FROM email_logs
+    WHERE message_id IN (SELECT value FROM json_each(:ids))
+""")
 
 # ---------------- Auth Routes ----------------
 
@@ -211,19 +219,17 @@ def get_email_status(message_id):
     scanned = False
     explanation = None
     
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT phishing, confidence, explanation FROM email_logs WHERE message_id = ?",
-            (message_id,)
-        )
-        row = cursor.fetchone()
-        if row:
-            is_phishing = bool(row[0])
-            confidence = row[1] or 0
-            explanation = row[2]
-            scanned = True
-            
+    row = execute_query(
+        "SELECT phishing, confidence, explanation FROM email_logs WHERE message_id = ?",
+        (message_id,),
+        fetch_one=True
+    )
+    if row:
+        is_phishing = bool(row[0])
+        confidence = row[1] or 0
+        explanation = row[2]
+        scanned = True
+        
     return is_phishing, confidence, scanned, explanation
 
 # ---------------- API: View Email ----------------
@@ -339,29 +345,26 @@ def inbox_content():
         phishing_map = {}
         
         if msg_ids:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                placeholders = ",".join("?" * len(msg_ids))
-                query = f"SELECT message_id, phishing, confidence, reason, explanation FROM email_logs WHERE message_id IN ({placeholders})"
-                cursor.execute(query, msg_ids)
-                rows = cursor.fetchall()
-                
-                for row in rows:
-                    explanation_html = ""
-                    explanation = row[4]
-                    if explanation:
-                        try:
-                            exp_data = json.loads(explanation) if isinstance(explanation, str) else explanation
-                            if exp_data:
-                                explanation_html = get_explanation_html(exp_data)
-                        except: pass
-                        
-                    phishing_map[row[0]] = {
-                        "is_phishing": bool(row[1]),
-                        "confidence": row[2] or 0,
-                        "reason": row[3] or "",
-                        "explanation_html": explanation_html
-                    }
+            rows = execute_query_template(
+                "email_status_by_ids", {"ids": json.dumps(msg_ids)}, fetch_all=True
+            )
+            
+            for row in rows:
+                explanation_html = ""
+                explanation = row[4]
+                if explanation:
+                    try:
+                        exp_data = json.loads(explanation) if isinstance(explanation, str) else explanation
+                        if exp_data:
+                            explanation_html = get_explanation_html(exp_data)
+                    except: pass
+                    
+                phishing_map[row[0]] = {
+                    "is_phishing": bool(row[1]),
+                    "confidence": row[2] or 0,
+                    "reason": row[3] or "",
+                    "explanation_html": explanation_html
+                }
 
         # 3. Assemble
         emails = []
@@ -493,10 +496,7 @@ def scan_emails():
 
                 for m in messages:
                     # Check if already scanned to avoid redundant work
-                    with get_db_connection() as conn:
-                        cursor = conn.cursor()
-                        cursor.execute("SELECT phishing FROM email_logs WHERE message_id = ?", (m["id"],))
-                        exists = cursor.fetchone()
+                    exists = execute_query("SELECT phishing FROM email_logs WHERE message_id = ?", (m["id"],), fetch_one=True)
                     
                     if exists:
                         SCAN_PROGRESS["current"] += 1
@@ -623,31 +623,27 @@ def all_mail():
         phishing_map = {}
         
         if msg_ids:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                # Create placeholders for IN clause
-                placeholders = ','.join(['?'] * len(msg_ids))
-                query = f"SELECT message_id, phishing, confidence, reason, explanation FROM email_logs WHERE message_id IN ({placeholders})"
-                cursor.execute(query, msg_ids)
-                rows = cursor.fetchall()
-                
-                for row in rows:
-                    exp_html = ""
-                    reasonv = row[3] or ""
-                    explanationv = row[4]
-                    if explanationv:
-                        try:
-                            import json
-                            exp_data = json.loads(explanationv) if isinstance(explanationv, str) else explanationv
-                            if exp_data: exp_html = get_explanation_html(exp_data)
-                        except: pass
-
-                    phishing_map[row[0]] = {
-                        "is_phishing": bool(row[1]),
-                        "confidence": row[2] or 0,
-                        "reason": reasonv,
-                        "explanation_html": exp_html
-                    }
+            # One stable SQL string whatever the page size
+            rows = execute_query_template(
+                "email_status_by_ids", {"ids": json.dumps(msg_ids)}, fetch_all=True
+            )
+            
+            for row in rows:
+                exp_html = ""
+                reasonv = row[3] or ""
+                explanationv = row[4]
+                if explanationv:
+                    try:
+                        exp_data = json.loads(explanationv) if isinstance(explanationv, str) else explanationv
+                        if exp_data: exp_html = get_explanation_html(exp_data)
+                    except: pass
+
+                phishing_map[row[0]] = {
+                    "is_phishing": bool(row[1]),
+                    "confidence": row[2] or 0,
+                    "reason": reasonv,
+                    "explanation_html": exp_html
+                }
 
         # 4. Assemble Final List
         emails = []
@@ -751,26 +747,24 @@ def starred_mail():
             confidence = 0
             reason = ""
             explanation_html = ""
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT phishing, confidence, reason, explanation FROM email_logs WHERE message_id = ?",
-                    (m["id"],)
-                )
-                row = cursor.fetchone()
-                if row:
-                    is_phishing = bool(row[0])
-                    confidence = row[1] or 0
-                    reason = row[2] or ""
-                    explanation = row[3]
-                    if explanation:
-                        try:
-                            import json
-                            exp_data = json.loads(explanation) if isinstance(explanation, str) else explanation
-                            if exp_data:
-                                explanation_html = get_explanation_html(exp_data)
-                        except:
-                            pass
+            row = execute_query(
+                "SELECT phishing, confidence, reason, explanation FROM email_logs WHERE message_id = ?",
+                (m["id"],),
+                fetch_one=True
+            )
+            if row:
+                is_phishing = bool(row[0])
+                confidence = row[1] or 0
+                reason = row[2] or ""
+                explanation = row[3]
+                if explanation:
+                    try:
+                        import json
+                        exp_data = json.loads(explanation) if isinstance(explanation, str) else explanation
+                        if exp_data:
+                            explanation_html = get_explanation_html(exp_data)
+                    except:
+                        pass
             
             emails.append({
                 "id": m["id"],
@@ -825,26 +819,24 @@ def sent_mail():
             reason = ""
             explanation_html = ""
             row = None
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT phishing, confidence, reason, explanation FROM email_logs WHERE message_id = ?",
-                    (m["id"],)
-                )
-                row = cursor.fetchone()
-                if row:
-                    try:
-                        is_phishing = bool(row[0])
-                        confidence = row[1] or 0
-                        reason = row[2] or ""
-                        explanation = row[3] if len(row) > 3 else None
-                        if explanation:
-                            import json
-                            exp_data = json.loads(explanation) if isinstance(explanation, str) else explanation
-                            if exp_data:
-                                explanation_html = get_explanation_html(exp_data)
-                    except Exception as e:
-                        logger.warning(f"Metadata fetch error: {e}")
+            row = execute_query(
+                "SELECT phishing, confidence, reason, explanation FROM email_logs WHERE message_id = ?",
+                (m["id"],),
+                fetch_one=True
+            )
+            if row:
+                try:
+                    is_phishing = bool(row[0])
+                    confidence = row[1] or 0
+                    reason = row[2] or ""
+                    explanation = row[3] if len(row) > 3 else None
+                    if explanation:
+                        import json
+                        exp_data = json.loads(explanation) if isinstance(explanation, str) else explanation
+                        if exp_data:
+                            explanation_html = get_explanation_html(exp_data)
+                except Exception as e:
+                    logger.warning(f"Metadata fetch error: {e}")
 
             emails.append({
                 "id": m["id"],
@@ -902,27 +894,25 @@ def trash():
             action = ""
             row = None
             
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT phishing, confidence, reason, explanation, action FROM email_logs WHERE message_id = ?",
-                    (m["id"],)
-                )
-                row = cursor.fetchone()
-                if row:
-                    try:
-                        is_phishing = bool(row[0])
-                        confidence = row[1] or 0
-                        reason = row[2] or ""
-                        explanation = row[3] if len(row) > 3 else None
-                        action = row[4] if len(row) > 4 else ""
-                        if explanation:
-                            import json
-                            exp_data = json.loads(explanation) if isinstance(explanation, str) else explanation
-                            if exp_data:
-                                explanation_html = get_explanation_html(exp_data)
-                    except Exception as e:
-                        logger.warning(f"Trash metadata error: {e}")
+            row = execute_query(
+                "SELECT phishing, confidence, reason, explanation, action FROM email_logs WHERE message_id = ?",
+                (m["id"],),
+                fetch_one=True
+            )
+            if row:
+                try:
+                    is_phishing = bool(row[0])
+                    confidence = row[1] or 0
+                    reason = row[2] or ""
+                    explanation = row[3] if len(row) > 3 else None
+                    action = row[4] if len(row) > 4 else ""
+                    if explanation:
+                        import json
+                        exp_data = json.loads(explanation) if isinstance(explanation, str) else explanation
+                        if exp_data:
+                            explanation_html = get_explanation_html(exp_data)
+                except Exception as e:
+                    logger.warning(f"Trash metadata error: {e}")
             
             # Format date nicely
             date_str = ""
@@ -1025,7 +1015,7 @@ def api_delete_email():
 def phishing_logs():
     try:
         emails = []
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT sender, subject, body, phishing, confidence, reason, action, explanation, created_at, message_id
@@ -1128,16 +1118,12 @@ def api_stats():
             allmail_count = inbox_count + sent_count
 
         # DB counts for protection stats
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            # We count distinct message IDs to avoid double-counting re-scans
-            cursor.execute("SELECT COUNT(DISTINCT message_id) FROM email_logs")
-            total_scanned = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(DISTINCT message_id) FROM email_logs WHERE phishing = 1")
-            phishing_detected = cursor.fetchone()[0]
-            
-            safe_scanned = total_scanned - phishing_detected
+        # We count distinct message IDs to avoid double-counting re-scans
+        total_scanned = execute_query("SELECT COUNT(DISTINCT message_id) FROM email_logs", fetch_one=True)[0]
+        
+        phishing_detected = execute_query("SELECT COUNT(DISTINCT message_id) FROM email_logs WHERE phishing = 1", fetch_one=True)[0]
+        
+        safe_scanned = total_scanned - phishing_detected
             
         # Adjust Inbox count to reflect ONLY safe emails (UI consistency)
         # We subtract phishing count because our UI strictly hides them, even if Gmail API still reports them in Inbox.
@@ -1185,16 +1171,14 @@ def api_check_new_emails():
             maxResults=10
         ).execute()
 
-        new_emails = []
+        pending = []
         for m in results.get("messages", []):
             # Check if we've already processed this email
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT COUNT(*) FROM email_logs WHERE message_id = ?",
-                    (m["id"],)
-                )
-                already_processed = cursor.fetchone()[0] > 0
+            already_processed = execute_query(
+                "SELECT COUNT(*) FROM email_logs WHERE message_id = ?",
+                (m["id"],),
+                fetch_one=True
+            )[0] > 0
             
             # Skip if already processed
             if already_processed:
@@ -1208,11 +1192,17 @@ def api_check_new_emails():
             ).execute()
 
             headers = {h["name"]: h["value"] for h in msg["payload"]["headers"]}
-            body = msg.get("snippet", "")
-            
-            # Check if phishing
-            is_phish, conf, reason, exp = ml_predict(body)
-            
+            pending.append((m["id"], headers, msg.get("snippet", "")))
+
+        # Check all new emails for phishing in one batch
+        predictions = ml_predict_batch(
+            [body for _, _, body in pending],
+            senders=[headers.get("From", "") for _, headers, _ in pending],
+            subjects=[headers.get("Subject", "") for _, headers, _ in pending]
+        )
+
+        new_emails = []
+        for (message_id, headers, body), (is_phish, conf, reason, exp) in zip(pending, predictions):
             # Log all emails (safe and phishing)
             log_email(
                 sender=headers.get("From", ""),
@@ -1222,16 +1212,16 @@ def api_check_new_emails():
                 reason=reason,
                 action="Moved to Trash" if is_phish else "Delivered to Inbox",
                 explanation=exp,
-                message_id=m["id"],
+                message_id=message_id,
                 body=body
             )
             
             # Only add phishing emails to new_emails for alerts
             # Safe emails are logged but don't trigger alerts
             if is_phish:
-                move_to_trash(service, m["id"])
+                move_to_trash(service, message_id)
                 new_emails.append({
-                    "id": m["id"],
+                    "id": message_id,
                     "sender": headers.get("From", ""),
                     "subject": headers.get("Subject", ""),
                     "body": body,
@@ -1265,14 +1255,12 @@ def api_scan_email():
             return jsonify({"error": "Gmail unavailable"}), 500
             
         # 1. Check if already scanned
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT phishing, confidence, reason, explanation FROM email_logs WHERE message_id = ?",
-                (message_id,)
-            )
-            row = cursor.fetchone()
-            
+        row = execute_query(
+            "SELECT phishing, confidence, reason, explanation FROM email_logs WHERE message_id = ?",
+            (message_id,),
+            fetch_one=True
+        )
+        
         if row:
             exp_html = ""
             if row[3]: # explanation
@@ -21,12 +21,7 @@ Best regards,
 PayPal Security Team
 """
 
-phishing_words = [
-    {'word': 'urgent', 'weight': 0.45},
-    {'word': 'verify', 'weight': 0.38},
-    {'word': 'suspended', 'weight': 0.35},
-    {'word': 'immediately', 'weight': 0.32}
-]
+phishing_words = ['urgent', 'verify', 'suspended', 'immediately']
 
 confidence = 0.89
 
@@ -8,7 +8,12 @@ def test_inference():
         print("Model not found!")
         return
 
-    model, vectorizer = joblib.load(MODEL_PATH)
+    obj = joblib.load(MODEL_PATH)
+    # train_model.py saves a Pipeline; older models are a (model, vectorizer) tuple
+    if hasattr(obj, 'named_steps'):
+        model, vectorizer = obj[-1], obj[:-1]
+    else:
+        model, vectorizer = obj
     
     test_emails = [
         "Hey, can you verify if you received the files? Also, let me know if you need anything else.", # Safe
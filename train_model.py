@@ -1,8 +1,12 @@
 import os
+import tempfile
+import warnings
 import joblib
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, HashingVectorizer, TfidfTransformer, TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
 
@@ -11,7 +15,65 @@ ML_DIR = "ml"
 MODEL_FILE = "phishing_model.pkl"
 DATASET_PATH = "enron_spam.csv"  # Default to Enron dataset if it exists
 
-def train_model(dataset_path=None):
+# Comprehensive stop words to ignore common linguistic noise
+CUSTOM_STOP_WORDS = {
+    'just', 'start', 'we', 'now', 'pulled', 'jobs', 'alert', 'alerts',
+    'matching', 'profile', 'fresher', 'software', 'engineer', 'developer',
+    'weekly', 'report', 'stats', 'meeting', 'availability', 'purchase',
+    'device', 'reminder', 'renew', 'opportunities', 'unread', 'dashboard',
+    'comment', 'conversation', 'view', 'check', 'explore', 'exploring',
+    'com', 'iii', 'notification', 'notifications', 'update', 'updates',
+    'job', 'apply', 'application', 'status', 'candidate', 'resume', 'cv',
+    'interview', 'hiring', 'position', 'role', 'team', 'join', 'network',
+    'connection', 'connect', 'invitation', 'invite', 'linkedin', 'naukri',
+    'indeed', 'glassdoor', 'recruiter', 'talent', 'acquisition', 'hr'
+}
+STOP_WORDS = frozenset(ENGLISH_STOP_WORDS) | CUSTOM_STOP_WORDS
+
+# Corpora at least this large are tokenized across all cores; below it the
+# worker start-up costs more than it saves
+PARALLEL_TOKENIZE_MIN_DOCS = 10000
+TOKENIZE_CHUNK_SIZE = 1024
+
+
+def _analyze_chunk(analyzer, chunk):
+    return [analyzer(text) for text in chunk]
+
+
+def _pretokenized(tokens):
+    return tokens
+
+
+def _parallel_fit_transform(vectorizer, texts):
+    """
+    Fit a TfidfVectorizer with tokenization spread over worker processes
+    Returns: document-term matrix, same as vectorizer.fit_transform(texts)
+    """
+    analyzer = vectorizer.build_analyzer()
+    chunks = [texts[i:i + TOKENIZE_CHUNK_SIZE] for i in range(0, len(texts), TOKENIZE_CHUNK_SIZE)]
+    tokens = [
+        doc
+        for chunk in joblib.Parallel(n_jobs=-1)(
+            joblib.delayed(_analyze_chunk)(analyzer, chunk) for chunk in chunks
+        )
+        for doc in chunk
+    ]
+
+    # Fit on the token lists, then restore the word analyzer so the saved
+    # model tokenizes raw text at inference exactly as it did here
+    vectorizer.set_params(analyzer=_pretokenized)
+    try:
+        with warnings.catch_warnings():
+            # stop_words/ngram_range are unused with a callable analyzer;
+            # they were already applied by the analyzer built above
+            warnings.simplefilter("ignore", UserWarning)
+            X = vectorizer.fit_transform(tokens)
+    finally:
+        vectorizer.set_params(analyzer='word')
+    return X
+
+
+def train_model(dataset_path=None, use_hashing=False, compress=False):
     if not os.path.exists(ML_DIR):
         os.makedirs(ML_DIR)
         print(f"Created directory: {ML_DIR}")
@@ -37,37 +99,47 @@ def train_model(dataset_path=None):
     # ML Pipeline
     print("Vectorizing data...")
     
-    # Comprehensive stop words to ignore common linguistic noise
-    custom_stop_words = [
-        'just', 'start', 'we', 'now', 'pulled', 'pulled', 'jobs', 'alert', 'alerts',
-        'matching', 'profile', 'fresher', 'software', 'engineer', 'developer',
-        'weekly', 'report', 'stats', 'meeting', 'availability', 'purchase',
-        'device', 'reminder', 'renew', 'opportunities', 'unread', 'dashboard',
-        'comment', 'conversation', 'view', 'check', 'explore', 'exploring',
-        'com', 'iii', 'notification', 'notifications', 'update', 'updates',
-        'job', 'apply', 'application', 'status', 'candidate', 'resume', 'cv',
-        'interview', 'hiring', 'position', 'role', 'team', 'join', 'network',
-        'connection', 'connect', 'invitation', 'invite', 'linkedin', 'naukri',
-        'indeed', 'glassdoor', 'recruiter', 'talent', 'acquisition', 'hr'
-    ]
-    from sklearn.feature_extraction import text
-    stop_words = list(text.ENGLISH_STOP_WORDS.union(custom_stop_words))
-
-    # Improved vectorization:
-    # - min_df=3: Ignore words that appear in fewer than 3 documents
-    # - max_df=0.7: Ignore words that appear in more than 70% of documents
-    # - n-gram range (1,3): Still look at common phrases
-    vectorizer = TfidfVectorizer(
-        max_features=5000, 
-        stop_words=stop_words, 
-        ngram_range=(1, 3), 
-        sublinear_tf=True,
-        min_df=3,
-        max_df=0.7,
-        strip_accents='unicode'
-    )
+    # scikit-learn only accepts a list here and turns it back into a
+    # frozenset internally for its per-token membership test
+    stop_words = list(STOP_WORDS)
+
+    if use_hashing:
+        # Stateless hashing front end: no vocabulary dict to probe per token or
+        # to pickle, at the cost of min_df/max_df pruning and feature names
+        # (explanations then always go through LIME)
+        vectorizer = Pipeline([
+            ('hv', HashingVectorizer(
+                n_features=2**17,
+                stop_words=stop_words,
+                ngram_range=(1, 2),
+                alternate_sign=False,
+                strip_accents='unicode',
+                dtype=np.float32
+            )),
+            ('tfidf', TfidfTransformer(sublinear_tf=True))
+        ])
+    else:
+        # Improved vectorization:
+        # - min_df=3: Ignore words that appear in fewer than 3 documents
+        # - max_df=0.7: Ignore words that appear in more than 70% of documents
+        # - n-gram range (1,3): Still look at common phrases
+        # - float32: halves the bytes streamed through transform and predict
+        vectorizer = TfidfVectorizer(
+            max_features=5000, 
+            stop_words=stop_words, 
+            ngram_range=(1, 3), 
+            sublinear_tf=True,
+            min_df=3,
+            max_df=0.7,
+            strip_accents='unicode',
+            dtype=np.float32
+        )
     
-    X = vectorizer.fit_transform(texts)
+    if not use_hashing and len(texts) >= PARALLEL_TOKENIZE_MIN_DOCS:
+        print("Tokenizing in parallel...")
+        X = _parallel_fit_transform(vectorizer, texts)
+    else:
+        X = vectorizer.fit_transform(texts)
     
     # Split for validation to show user metrics
     if len(texts) > 20:
@@ -89,13 +161,48 @@ def train_model(dataset_path=None):
         model.fit(X, labels)
         print(f"Training accuracy: {model.score(X, labels)*100:.2f}%")
 
-    # Save
+    # Keep the linear algebra in float32 end to end
+    model.coef_ = model.coef_.astype(np.float32)
+    if use_hashing:
+        pipe = Pipeline(vectorizer.steps + [('lr', model)])
+    else:
+        pipe = Pipeline([('tfidf', vectorizer), ('lr', model)])
+
+    # Save uncompressed by default: ml_detector loads with mmap_mode='r' so
+    # forked workers share the numpy arrays, and joblib cannot mmap compressed
+    # files. --compress trades that sharing for a smaller file (lz4 if
+    # installed, else zlib).
     model_path = os.path.join(ML_DIR, MODEL_FILE)
-    joblib.dump((model, vectorizer), model_path)
+    if compress:
+        try:
+            import lz4  # noqa: F401
+            compression = ('lz4', 3)
+        except ImportError:
+            compression = ('zlib', 3)
+    else:
+        compression = 0
+
+    # Write a temp file next to the model and rename it into place: a running
+    # app has the old file memory-mapped, and rewriting it in place would
+    # crash it with SIGBUS. The rename leaves the old inode to those readers.
+    fd, tmp_path = tempfile.mkstemp(dir=ML_DIR, prefix=MODEL_FILE, suffix=".tmp")
+    os.close(fd)
+    try:
+        joblib.dump(pipe, tmp_path, compress=compression)
+        os.replace(tmp_path, model_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
     print(f"\n[OK] ML phishing model persisted at: {model_path}")
 
 if __name__ == "__main__":
     # Check if a CSV was passed as an argument
     import sys
-    csv_arg = sys.argv[1] if len(sys.argv) > 1 else DATASET_PATH
-    train_model(csv_arg)
+    flags = {"--hashing", "--compress"}
+    args = [a for a in sys.argv[1:] if a not in flags]
+    csv_arg = args[0] if args else DATASET_PATH
+    train_model(
+        csv_arg,
+        use_hashing="--hashing" in sys.argv[1:],
+        compress="--compress" in sys.argv[1:]
+    )
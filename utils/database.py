@@ -1,60 +1,423 @@
 """
 Database utility functions with connection pooling and better error handling.
 """
+import atexit
 import sqlite3
+import sys
 import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from functools import lru_cache
 from config import config
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Thread-local storage for database connections
+# Cursors kept per connection, keyed by SQL text, so repeated queries reuse
+# their compiled statement instead of being re-parsed and re-planned
+STATEMENT_CACHE_SIZE = 64
+# Size of sqlite3's own per-connection prepared statement cache. The app
+# issues far fewer than this many distinct SQL strings; keep it that way
+# (bind values as parameters, never format them into the SQL) or statements
+# start being recompiled.
+CACHED_STATEMENTS = 256
+
+# Rows pulled per fetchmany() batch by streaming cursors
+# (execute_query(iter_rows=True))
+ITER_ARRAYSIZE = 64
+
+# Per-connection settings applied to every new connection
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",  # fsync at checkpoints only; safe under WAL
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256 MiB
+    "PRAGMA cache_size=-20000",  # 20 MiB page cache
+    "PRAGMA busy_timeout=10000",
+)
+
+# Upper bound on open read-only connections; WAL lets them all read while
+# the single writer connection commits. Callers beyond a pool's size wait.
+MAX_POOL = config.DATABASE_POOL_SIZE
+WRITER_POOL_SIZE = 1
+POOL_TIMEOUT = 10.0  # seconds
+
+# WAL is stored in the database file, so it only needs switching on once
+_wal_initialized = False
+
+# Named SQL registered with register_template()
+_templates = {}
+
+# Connections of the transaction() block and the writer checked out on this
+# thread, if any, so nested calls reuse them. Read
+# through _local.__dict__.get(): one dict lookup on the per-call hot path.
 _local = threading.local()
 
 
-@contextmanager
-def get_db_connection():
+class _PooledConnection(sqlite3.Connection):
     """
-    Context manager for database connections.
-    Uses thread-local storage to reuse connections within the same thread.
+    sqlite3 connection carrying its own cursor cache.
+    Inside a transaction() block commit() and rollback() are left to the
+    outermost block, so existing helpers that commit after each write can
+    take part in a larger transaction.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stmt_cache = OrderedDict()
+        self.txn_depth = 0
+
+    def commit(self):
+        if not self.txn_depth:
+            super().commit()
+
+    def rollback(self):
+        if not self.txn_depth:
+            super().rollback()
+
+
+def _configure_connection(conn):
+    """Enable WAL journaling (once per process) and apply CONNECTION_PRAGMAS"""
+    global _wal_initialized
+    if not _wal_initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        _wal_initialized = True
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+
+
+def _connect(readonly=False):
+    """Open and configure a new pooled connection"""
+    conn = sqlite3.connect(
+        str(config.DATABASE_PATH),
+        # Required: pooled connections are opened on one thread (or by
+        # warm_pool's executor) and checked out by others. The pool hands
+        # each connection to one thread at a time.
+        check_same_thread=False,
+        timeout=10.0,
+        cached_statements=CACHED_STATEMENTS,
+        # Autocommit: single writes pay for no implicit BEGIN and commit()
+        # is a no-op; group related writes with transaction()
+        isolation_level=None,
+        factory=_PooledConnection
+    )
+    # Rows stay plain tuples; callers index them by position. Pass
+    # row_factory=sqlite3.Row or namedtuple_row to execute_query for names.
+    _configure_connection(conn)
+    if readonly:
+        conn.execute("PRAGMA query_only=1")
+        conn.execute("PRAGMA read_uncommitted=0")
+    logger.debug("Created new database connection")
+    return conn
+
+
+class _ConnectionPool:
+    """
+    Bounded pool of connections. Idle connections sit in a deque whose
+    append/pop are atomic, so a free connection is taken without any
+    pool-wide lock, most recently returned first to reuse the warmest page
+    cache. The condition is only used to open a new connection or to wait
+    when all size connections are checked out, and release() only takes it
+    when a thread is waiting.
     """
-    if not hasattr(_local, 'connection') or _local.connection is None:
+
+    def __init__(self, size, readonly=False):
+        self.readonly = readonly
+        self._size = size
+        self._open = 0
+        self._waiters = 0
+        self._idle = deque()
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        deadline = None
+        while True:
+            try:
+                return self._idle.pop()
+            except IndexError:
+                pass
+            
+            with self._cond:
+                if self._open < self._size:
+                    self._open += 1
+                    break
+                # Register as a waiter before re-checking the deque, so a
+                # release() that appends after this check sees the waiter
+                self._waiters += 1
+                try:
+                    if self._idle:
+                        continue
+                    if deadline is None:
+                        deadline = time.monotonic() + POOL_TIMEOUT
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise sqlite3.OperationalError("Timed out waiting for a database connection")
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+        
         try:
-            _local.connection = sqlite3.connect(
-                str(config.DATABASE_PATH),
-                check_same_thread=False,
-                timeout=10.0
-            )
-            _local.connection.row_factory = sqlite3.Row
-            logger.debug("Created new database connection")
+            conn = _connect(self.readonly)
         except sqlite3.Error as e:
-            logger.error(f"Error creating database connection: {e}")
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            logger.error("Error creating database connection: %s", e)
             raise
+        return conn
+
+    def release(self, conn):
+        self._idle.append(conn)
+        if self._waiters:
+            with self._cond:
+                self._cond.notify()
+
+    def warm(self, count):
+        """
+        Open up to count connections in parallel and park them as idle.
+        Returns: number of connections opened
+        """
+        with self._cond:
+            count = max(0, min(count, self._size - self._open))
+            self._open += count
+        if not count:
+            return 0
+        
+        opened = 0
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = [executor.submit(_connect, self.readonly) for _ in range(count)]
+        for future in futures:
+            try:
+                self._idle.append(future.result())
+                opened += 1
+            except sqlite3.Error as e:
+                logger.error("Error creating database connection: %s", e)
+        with self._cond:
+            self._open -= count - opened
+            self._cond.notify_all()
+        return opened
+
+    def close_idle(self):
+        while True:
+            try:
+                conn = self._idle.pop()
+            except IndexError:
+                break
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            try:
+                conn.close()
+            except Exception as e:
+                logger.error("Error closing database connection: %s", e)
+
+
+_reader_pool = _ConnectionPool(MAX_POOL, readonly=True)
+_writer_pool = _ConnectionPool(WRITER_POOL_SIZE)
+
+
+def warm_pool(readers=None):
+    """
+    Open the writer and `readers` reader connections (default: the whole
+    reader pool) in parallel, so the first burst of requests after start-up
+    does not pay for connect + PRAGMAs one after another.
+    Call once the database file exists (after init_db()).
+    """
+    if readers is None:
+        readers = MAX_POOL
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(_writer_pool.warm, WRITER_POOL_SIZE)
+        opened = executor.submit(_reader_pool.warm, readers).result()
+    logger.debug("Warmed database pool with %s reader connections", opened)
+
+
+@contextmanager
+def get_db_connection(readonly=False):
+    """
+    Context manager for database connections.
+    Borrows a connection from the shared pool and returns it on exit.
+    readonly=True borrows from the query_only reader pool; otherwise the
+    single writer connection is used. Inside a transaction() block the
+    transaction's connection is reused, and a thread already holding the
+    writer reuses it for nested writer requests rather than waiting on it.
+    """
+    held = _local.__dict__.get('txn_conn')
+    if held is None and not readonly:
+        held = _local.__dict__.get('writer_conn')
+    if held is not None:
+        yield held
+        return
     
+    pool = _reader_pool if readonly else _writer_pool
+    conn = pool.acquire()
+    if not readonly:
+        _local.writer_conn = conn
     try:
-        yield _local.connection
+        yield conn
     except sqlite3.Error as e:
-        logger.error(f"Database error: {e}")
-        _local.connection.rollback()
+        logger.error("Database error: %s", e)
+        conn.rollback()
         raise
     finally:
-        # Don't close connection, keep it for thread reuse
-        pass
+        if not readonly:
+            _local.writer_conn = None
+        pool.release(conn)
+
+
+@contextmanager
+def transaction():
+    """
+    Context manager grouping several writes into one transaction and one
+    commit. Rolls back if the block raises. Nested blocks, and any
+    get_db_connection/execute_query calls inside, join the outer transaction.
+    """
+    conn = _local.__dict__.get('txn_conn')
+    if conn is not None:
+        conn.txn_depth += 1
+        try:
+            yield conn
+        finally:
+            conn.txn_depth -= 1
+        return
+    
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.txn_depth = 1
+        _local.txn_conn = conn
+        succeeded = False
+        try:
+            yield conn
+            succeeded = True
+        finally:
+            conn.txn_depth = 0
+            _local.txn_conn = None
+            if succeeded:
+                conn.commit()
+            else:
+                conn.rollback()
 
 
 def close_db_connection():
-    """Close the thread-local database connection"""
-    if hasattr(_local, 'connection') and _local.connection:
+    """
+    Close all idle pooled database connections.
+    Runs automatically at interpreter exit, so WAL files are checkpointed
+    and released even if the app never calls it.
+    """
+    _reader_pool.close_idle()
+    _writer_pool.close_idle()
+
+
+atexit.register(close_db_connection)
+
+
+@lru_cache(maxsize=512)
+def _canonical(query):
+    """
+    Collapse whitespace so formatting variants of one query share a cached
+    statement. SQL containing quotes or -- comments is left alone, since
+    whitespace inside a literal and the newline ending a comment matter.
+    Returns: interned SQL string
+    """
+    if "'" not in query and '"' not in query and '--' not in query:
+        query = " ".join(query.split())
+    return sys.intern(query)
+
+
+@lru_cache(maxsize=512)
+def _is_read(query):
+    """
+    Whether a canonical SQL string is a plain SELECT. WITH is not counted:
+    a CTE may lead into INSERT/UPDATE/DELETE, which query_only readers reject.
+    """
+    return query.lstrip()[:6].upper() == 'SELECT'
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _row_class(fields):
+    return namedtuple('Row', fields, rename=True)
+
+
+def namedtuple_row(cursor, row):
+    """Row factory returning namedtuples; one class is built per column set"""
+    return _row_class(tuple(column[0] for column in cursor.description))(*row)
+
+
+def _execute(conn, query, params):
+    """
+    Run a query on the connection's cached cursor for that SQL.
+    On a miss the cursor comes straight from conn.execute; the least recently
+    used cursor is closed once the cache is full.
+    Returns: the executed cursor
+    """
+    cache = conn.stmt_cache
+    cursor = cache.get(query)
+    if cursor is not None:
+        cache.move_to_end(query)
+        return cursor.execute(query, params)
+    
+    cursor = conn.execute(query, params)
+    cache[query] = cursor
+    if len(cache) > STATEMENT_CACHE_SIZE:
+        _, evicted = cache.popitem(last=False)
+        evicted.close()
+    return cursor
+
+
+def _discard_cursor(conn, query, cursor):
+    """
+    Close a cached cursor whose result set was not read to the end and drop
+    it from the cache. A half-read statement stays active and keeps the
+    connection's read transaction (and its snapshot of the WAL) open.
+    """
+    if conn.stmt_cache.get(query) is cursor:
+        del conn.stmt_cache[query]
+    cursor.close()
+
+
+def execute_many(query, seq_of_params):
+    """
+    Execute one statement for every parameter set in a single transaction.
+    Prefer this over calling execute_query in a loop: the SQL is prepared
+    once and all rows share one commit.
+    
+    Args:
+        query: SQL query string
+        seq_of_params: Iterable of parameter tuples or dicts
+    
+    Returns:
+        Number of rows affected
+    """
+    query = _canonical(query)
+    try:
+        with transaction() as conn:
+            return conn.executemany(query, seq_of_params).rowcount
+    except sqlite3.Error as e:
+        logger.error("Batch execution error: %s", e)
+        raise
+
+
+def _iter_rows(query, params, row_factory):
+    """
+    Stream result rows, holding a pooled connection until the iterator is
+    exhausted or closed. Uses its own cursor rather than the cached one so
+    the rows cannot be reset by another query on the same connection.
+    """
+    with get_db_connection(readonly=_is_read(query)) as conn:
+        cursor = conn.execute(query, params)
+        cursor.row_factory = row_factory
         try:
-            _local.connection.close()
-        except Exception as e:
-            logger.error(f"Error closing database connection: {e}")
+            while True:
+                rows = cursor.fetchmany(ITER_ARRAYSIZE)
+                if not rows:
+                    break
+                yield from rows
         finally:
-            _local.connection = None
+            cursor.close()
 
 
-def execute_query(query, params=None, fetch_one=False, fetch_all=False):
+def execute_query(query, params=None, fetch_one=False, fetch_all=False, many=False, iter_rows=False,
+                  row_factory=None):
     """
     Execute a database query safely.
     
@@ -63,26 +426,97 @@ def execute_query(query, params=None, fetch_one=False, fetch_all=False):
         params: Query parameters (tuple or dict)
         fetch_one: Return single row
         fetch_all: Return all rows
+        many: Treat params as a sequence of parameter sets (see execute_many)
+        iter_rows: Return an iterator streaming the rows instead of a list
+        row_factory: Row type for fetched rows (e.g. sqlite3.Row or
+            namedtuple_row); plain tuples by default
     
     Returns:
         Query result based on fetch flags
     """
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    query = _canonical(query)
+    if many:
+        return execute_many(query, params or ())
+    if iter_rows:
+        return _iter_rows(query, params or (), row_factory)
+    
+    # Fetching SELECTs go to the reader pool, everything else to the writer
+    readonly = (fetch_one or fetch_all) and _is_read(query)
+    with get_db_connection(readonly=readonly) as conn:
         try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+            cursor = _execute(conn, query, params or ())
+            cursor.row_factory = row_factory
             
             if fetch_one:
-                return cursor.fetchone()
+                row = cursor.fetchone()
+                _discard_cursor(conn, query, cursor)
+                return row
             elif fetch_all:
                 return cursor.fetchall()
             else:
+                rowcount = cursor.rowcount
+                if cursor.description is not None:
+                    # Unread result rows (e.g. a RETURNING clause)
+                    _discard_cursor(conn, query, cursor)
                 conn.commit()
-                return cursor.rowcount
+                return rowcount
         except sqlite3.Error as e:
             conn.rollback()
-            logger.error(f"Query execution error: {e}")
+            logger.error("Query execution error: %s", e)
             raise
+
+
+def execute_returning(query, params=None, row_factory=None):
+    """
+    Execute a single INSERT/UPDATE/DELETE ... RETURNING statement and get
+    the affected row back from the same statement (e.g. the new id), instead
+    of a follow-up lastrowid/rowcount lookup. In autocommit mode the
+    statement commits as soon as its rows are read; inside transaction() it
+    joins the open transaction.
+    
+    Args:
+        query: SQL query string with a RETURNING clause (SQLite >= 3.35)
+        params: Query parameters (tuple or dict)
+        row_factory: Row type for the returned row; plain tuple by default
+    
+    Returns:
+        First returned row, or None if no row was affected
+    """
+    query = _canonical(query)
+    if 'RETURNING' not in query.upper():
+        raise ValueError("execute_returning requires a RETURNING clause")
+    
+    with get_db_connection() as conn:
+        try:
+            cursor = _execute(conn, query, params or ())
+            cursor.row_factory = row_factory
+            # Step the statement to completion so it commits
+            rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error("Query execution error: %s", e)
+            raise
+    return rows[0] if rows else None
+
+
+def register_template(name, query):
+    """
+    Register a named SQL statement for execute_query_template.
+    Express optional filters inside the SQL, e.g.
+    "(:sender IS NULL OR sender = :sender)", and variable-length lists with
+    "IN (SELECT value FROM json_each(:ids))", so one stable SQL string (and
+    one cached statement) serves every combination of arguments.
+    """
+    _templates[name] = _canonical(query)
+
+
+def execute_query_template(name, params=None, **kwargs):
+    """
+    Execute a statement registered with register_template.
+    Takes the same keyword arguments as execute_query.
+    """
+    try:
+        query = _templates[name]
+    except KeyError:
+        raise KeyError(f"Unknown query template: {name}") from None
+    return execute_query(query, params, **kwargs)